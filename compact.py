@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+compact.py – rebuild latest_rfps.json from the scraper's append-only log
+=======================================================================
+* Reads latest_rfps.jsonl (one RFP entry per line, appended by scrape.py)
+* Keeps the newest entry per source URL, in first-seen order
+* Writes the canonical JSON array to latest_rfps.json for GPT ingestion
+"""
+
+from __future__ import annotations
+import logging, pathlib
+import orjson
+
+LOG_PATH  = pathlib.Path("latest_rfps.jsonl")
+JSON_PATH = pathlib.Path("latest_rfps.json")
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+def load_log(path: pathlib.Path) -> list[dict]:
+    """Entries from the log, deduplicated by source – later lines win."""
+    rfps: dict[str, dict] = {}
+    with path.open("rb") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = orjson.loads(line)
+            except orjson.JSONDecodeError:     # e.g. a run killed mid-write
+                logging.warning(f"⚠️  Skipping malformed line {lineno} of {path}")
+                continue
+            rfps[item["source"]] = item
+    return list(rfps.values())
+
+
+def main() -> None:
+    if not LOG_PATH.exists():
+        logging.warning(f"⚠️  {LOG_PATH} not found – run scrape.py first. {JSON_PATH} left as is.")
+        return
+    rfps = load_log(LOG_PATH)
+    JSON_PATH.write_bytes(orjson.dumps(rfps, option=orjson.OPT_INDENT_2))
+    logging.info(f"✅  Wrote {len(rfps)} total RFP entries to {JSON_PATH}")
+
+
+if __name__ == "__main__":
+    main()
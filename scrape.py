@@ -2,20 +2,22 @@
 """
 scrape.py – Pharma-industry RFP harvester
 ========================================
-* Visits each landing page listed in SITES
+* Visits each landing page listed in SITES (concurrently, via asyncio/httpx over HTTP/2)
+* Revalidates landing pages against a local sqlite cache (ETag / Last-Modified)
 * Finds links to .pdf, .doc, and .docx files.
-* Downloads new docs into ./data/<sha1>.<ext>
-* Extracts "Issued / Deadline" dates from page 1 of PDFs and DOCX files.
-* Merges everything into latest_rfps.json for GPT ingestion
+* Downloads new docs into ./data/<xxh64>.<ext>, tracked in ./data/index.sqlite
+* Extracts "Issued / Deadline" dates from page 1 of PDFs (PyMuPDF) and DOCX files.
+* Appends new entries to latest_rfps.jsonl; compact.py rebuilds latest_rfps.json for GPT ingestion
 """
 
 from __future__ import annotations
-import hashlib, json, re, pathlib, logging, datetime
-import requests, pdfplumber, docx  ## NEW: import docx
-from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from requests.exceptions import RequestException
-from urllib3.util.retry import Retry
+import asyncio, contextlib, hashlib, html, io, mmap, os, re, pathlib, logging, datetime, signal, sqlite3, time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Mapping, TypeVar
+from urllib.parse import SplitResult, urljoin, urlsplit
+import httpx, orjson, pdfplumber, pymupdf, docx, xxhash  ## NEW: import docx
+import lxml.etree, lxml.html
 
 # ---------------------------------------------------------------------
 # 0. Settings
@@ -37,159 +39,630 @@ SITES = {
 }
 
 DATA_DIR  = pathlib.Path("data")
-JSON_PATH = pathlib.Path("latest_rfps.json")
+JSON_PATH = pathlib.Path("latest_rfps.json")     # canonical array, rebuilt by compact.py
+LOG_PATH  = pathlib.Path("latest_rfps.jsonl")    # append-only, one entry per line
+INDEX_DB  = DATA_DIR / "index.sqlite"             # dedup index, committed with data/
+HTTP_CACHE = pathlib.Path(".http_cache.sqlite")   # landing pages only, never documents
+PAGE_TTL  = 3600                                 # seconds before a cached page is revalidated
+PLUMBER_TIMEOUT = 5                              # seconds allowed for the pdfplumber fallback
+SCANNED_TEXT_MIN = 50                            # fewer chars + images on a page → scanned
+MAX_PDF_BYTES = 50 << 20                         # bigger PDFs are listed but never downloaded
 DATA_DIR.mkdir(exist_ok=True)
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logging.getLogger("httpx").setLevel(logging.WARNING)   # it logs every request at INFO
 
 # ---------------------------------------------------------------------
-# 1. Retry-capable requests.Session
+# 1. Retry-capable httpx client + landing-page cache
 # ---------------------------------------------------------------------
-def build_session(retries: int = 3, backoff: int = 2, timeout: int = 30) -> requests.Session:
-    sess = requests.Session()
-    retry_cfg = Retry(
-        total=retries, read=retries, connect=retries,
-        backoff_factor=backoff, status_forcelist=[502, 503, 504]
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+}
+RETRY_STATUS = {502, 503, 504}
+FETCH_ERRORS = (httpx.HTTPError, httpx.InvalidURL)
+MAX_IN_FLIGHT = 16                       # landing pages + downloads share this
+MAX_PER_HOST  = 4                        # politeness cap; HTTP/2 multiplexes these on one connection
+fetch_slots: asyncio.Semaphore           # created per run by scrape_all()
+host_slots: dict[str, asyncio.Semaphore]
+T = TypeVar("T")
+
+CHUNK_SIZE = 1 << 16                     # 64 KiB per streamed read
+IN_MEMORY_MAX = 4 << 20                  # bigger bodies spill to disk and are parsed via mmap
+QUEUE_SIZE = 64                          # backpressure between pipeline stages
+PARSE_WORKERS = os.cpu_count() or 1
+
+def build_session(timeout: int = 30) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    return httpx.AsyncClient(
+        # one TLS handshake (and DNS lookup) per host; concurrent requests become
+        # HTTP/2 streams. No transport retries – with_retries() is the only layer.
+        transport=httpx.AsyncHTTPTransport(http2=True, limits=limits),
+        # per-phase limits, so large streamed downloads are not cut off
+        timeout=httpx.Timeout(timeout),
+        headers=HEADERS,
+        follow_redirects=True,
     )
-    adapter = HTTPAdapter(max_retries=retry_cfg)
-    sess.mount("https://", adapter)
-    sess.mount("http://",  adapter)
-    sess.headers.update({
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
-    })
-    return sess
 
-session = build_session()
+@contextlib.asynccontextmanager
+async def slot(url: str) -> AsyncIterator[None]:
+    """Hold one of the global request slots and one of the slots for url's host."""
+    host = host_slots.setdefault(urlsplit(url).netloc, asyncio.Semaphore(MAX_PER_HOST))
+    async with fetch_slots, host:
+        yield
+
+def check_status(resp: httpx.Response) -> None:
+    if resp.status_code != 304:          # httpx treats 304 as an error; to us it's an answer
+        resp.raise_for_status()
+
+async def with_retries(call: Callable[[], Awaitable[T]], retries: int = 3, backoff: int = 2) -> T:
+    """Await call(), retrying 502/503/504 and network errors with exponential backoff.
+
+    Errors a second try can't fix – unsupported scheme, invalid URL, redirect
+    loop, undecodable body – are raised at once.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await call()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in RETRY_STATUS or attempt == retries:
+                raise
+        except httpx.UnsupportedProtocol:            # a TransportError, but ftp:// stays ftp://
+            raise
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        await asyncio.sleep(backoff * 2 ** attempt)
+
+async def request(session: httpx.AsyncClient, url: str,
+                  headers: dict | None = None) -> tuple[int, Mapping[str, str], bytes]:
+    """GET url → (status, headers, body)."""
+    async def once():
+        async with slot(url):
+            resp = await session.get(url, headers=headers)
+        check_status(resp)
+        return resp.status_code, resp.headers, resp.content
+    return await with_retries(once)
+
+class TooLarge(Exception):
+    """The body is bigger than download() was allowed to fetch."""
+    def __init__(self, size: int):
+        super().__init__(f"{size} bytes")
+        self.size = size
+
+def part_path(path: pathlib.Path) -> pathlib.Path:
+    return path.with_name(path.name + ".part")
+
+async def download(session: httpx.AsyncClient, url: str, path: pathlib.Path,
+                   validators: dict | None = None,
+                   max_bytes: int | None = None) -> tuple[int, Mapping[str, str], str, bytes | None]:
+    """Stream url one chunk at a time → (status, headers, sha256 of the body, body).
+
+    Bodies up to IN_MEMORY_MAX come back as bytes and never touch the disk;
+    bigger ones are left in part_path(path) with body None. Keeping or
+    dropping the file is up to the caller. validators (If-None-Match /
+    If-Modified-Since) may turn the GET into a 304; the digest is then "".
+    A retry after a dropped on-disk transfer asks for the missing tail with
+    Range + If-Range; if the file changed in between, or the server ignores
+    ranges, the whole file comes again.
+    Raises TooLarge once the body is known to exceed max_bytes – from
+    Content-Length before anything is read, or mid-stream without one.
+    """
+    part = part_path(path)
+    part.unlink(missing_ok=True)         # leftovers from a crashed run are not ours
+    if_range = None                      # validator of the response the .part came from
+    async def once():
+        nonlocal if_range
+        have = part.stat().st_size if part.exists() else 0
+        if have and if_range:
+            headers = {"Range": f"bytes={have}-", "If-Range": if_range}
+        else:
+            headers = validators or {}
+        # offsets must count the file's bytes, not those of a gzip stream of it
+        headers = {"Accept-Encoding": "identity", **headers}
+        async with slot(url), session.stream("GET", url, headers=headers) as resp:
+            check_status(resp)
+            if resp.status_code == 304:
+                return resp.status_code, resp.headers, "", None
+            resumed = bool(have) and resp.status_code == 206 and \
+                resp.headers.get("Content-Range", "").startswith(f"bytes {have}-")
+            if not resumed:
+                part.unlink(missing_ok=True)
+                if resp.status_code == 206:      # not the tail we asked for; retry from scratch
+                    raise httpx.RemoteProtocolError(
+                        f"unexpected Content-Range {resp.headers.get('Content-Range')}")
+                etag = resp.headers.get("ETag")
+                if_range = etag if etag and not etag.startswith("W/") else resp.headers.get("Last-Modified")
+            size = have if resumed else 0
+            expected = size + int(resp.headers.get("Content-Length", 0))
+            if max_bytes and expected > max_bytes:
+                raise TooLarge(expected)
+            digest = hashlib.sha256()
+            if resumed:
+                with open(part, "rb") as f:
+                    for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(block)
+            chunks: list[bytes] | None = None if resumed else []
+            with contextlib.ExitStack() as stack:
+                f = stack.enter_context(open(part, "ab")) if resumed else None
+                async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:          # no (or a wrong) Content-Length
+                        raise TooLarge(size)
+                    if chunks is not None and size > IN_MEMORY_MAX:   # too big, spill to disk
+                        f = stack.enter_context(open(part, "wb"))
+                        f.writelines(chunks)
+                        chunks = None
+                    if chunks is None:
+                        f.write(chunk)
+                    else:
+                        chunks.append(chunk)
+            body = None if chunks is None else b"".join(chunks)
+            return resp.status_code, resp.headers, digest.hexdigest(), body
+    try:
+        return await with_retries(once)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+def open_page_cache(path: pathlib.Path) -> sqlite3.Connection:
+    """Landing-page cache: validators plus the links already extracted from the body."""
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS pages ("
+               "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, fetched REAL, links TEXT)")
+    return db
+
+page_cache = open_page_cache(HTTP_CACHE)
 
 # ---------------------------------------------------------------------
 # 2. Helpers
 # ---------------------------------------------------------------------
-PDF_RE = re.compile(r"https://[^\s\"']+\.pdf", re.I)
-date_pat = re.compile(r"(Issued|Posted):\s*([\d\w ,-]+)", re.I)
-ddl_pat  = re.compile(r"(Deadline|Due):\s*([\d\w ,-]+)", re.I)
+PDF_RE = re.compile(rb"https://[^\s\"']+\.pdf", re.I)
+WORD_DOC_RE = re.compile(rb"\.docx?(?!\w)")        # on lowered bytes; not window.document
+# One pass for both markers; a value starts with a word character and stops
+# where the next marker begins, so "Posted: Deadline: x" has no posted date.
+DATE_MARK = r"(?:Issued|Posted|Deadline|Due):"
+DATE_RE = re.compile(
+    rf"(?P<kind>Issued|Posted|Deadline|Due):\s*"
+    rf"(?P<val>(?!{DATE_MARK})[\w,-](?:(?!{DATE_MARK})[\w ,-])*)", re.I)
+DATE_KIND = {"issued": "posted", "posted": "posted", "deadline": "deadline", "due": "deadline"}
+
+async def doc_links(session: httpx.AsyncClient, url: str) -> set[str]:
+    row = page_cache.execute(
+        "SELECT etag, last_modified, fetched, links FROM pages WHERE url = ?", (url,)
+    ).fetchone()
+    if row and time.time() - row[2] < PAGE_TTL:
+        return set(orjson.loads(row[3]))
 
-def doc_links(url: str):
+    validators = {}
+    if row and row[0]:
+        validators["If-None-Match"] = row[0]
+    if row and row[1]:
+        validators["If-Modified-Since"] = row[1]
     try:
-        resp = session.get(url, timeout=30)
-        resp.raise_for_status()
-    except RequestException as e:
+        status, headers, body = await request(session, url, headers=validators)
+    except FETCH_ERRORS as e:
+        if row:                          # stale-if-error
+            logging.warning(f"STALE {url} ↯ {e}")
+            return set(orjson.loads(row[3]))
         logging.warning(f"SKIP {url} ↯ {e}")
-        return
+        return set()
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    if status == 304:                    # unchanged – reuse the links parsed last time
+        found_links = set(orjson.loads(row[3]))
+        etag, last_modified = headers.get("ETag", row[0]), headers.get("Last-Modified", row[1])
+    else:
+        found_links = extract_links(url, body)
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+    with page_cache:
+        page_cache.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+            (url, etag, last_modified, time.time(), orjson.dumps(sorted(found_links)).decode()),
+        )
+    return found_links
+
+def extract_links(url: str, body: bytes) -> set[str]:
+    # Fast path: if every ".pdf" on the page is an absolute URL the regex caught, and
+    # nothing mentions .doc/.docx, the raw scan already has all links – skip the DOM.
+    lowered = body.lower()
+    hits = PDF_RE.findall(body)
+    if hits and len(hits) == lowered.count(b".pdf") and not WORD_DOC_RE.search(lowered):
+        return {html.unescape(m.decode("utf-8", "replace")) for m in hits}   # &amp; as the DOM sees it
+
+    # raw bytes: lxml sniffs the charset itself, and xpath hands back plain strings
+    try:
+        hrefs = lxml.html.fromstring(body).xpath("//a[@href]/@href")
+    except lxml.etree.ParserError:       # empty / non-HTML body
+        hrefs = []
+    base = urlsplit(url)                 # parsed once per page, not once per anchor
     found_links = set()
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
+    for href in hrefs:
         if href.lower().endswith((".pdf", ".doc", ".docx")):
-            full_url = href if href.startswith("http") else requests.compat.urljoin(url, href)
+            full_url = href if href.startswith("http") else _join(base, url, href)
             found_links.add(full_url)
 
     if not found_links:
-        for m in PDF_RE.findall(resp.text):
-            found_links.add(m)
-    yield from found_links
+        for m in hits:
+            found_links.add(html.unescape(m.decode("utf-8", "replace")))
+    return found_links
 
-def parse_pdf(path: pathlib.Path) -> dict[str, str]:
-    """Return {posted, deadline, snippet} from first ~1500 chars of a PDF."""
+def _join(base: SplitResult, url: str, href: str) -> str:
+    """urljoin(url, href) by concatenation for plain relative links.
+
+    Anything urljoin would normalise – dot segments, empty segments, a scheme,
+    a query/fragment/params – is handed to urljoin itself.
+    """
+    rest = href[2:] if href.startswith("//") else href
+    if (not rest or rest[0] <= " " or (rest is not href and rest[0] == "/") or "//" in rest
+            or "./" in href or href.endswith(".") or any(c in href for c in "?#;\t\r\n")
+            or ":" in href.partition("/")[0] or "/." in base.path or ";" in base.path):
+        return urljoin(url, href)
+    if href.startswith("//"):
+        return f"{base.scheme}:{href}"
+    if href.startswith("/"):
+        return f"{base.scheme}://{base.netloc}{href}"
+    path = base.path or "/"
+    return f"{base.scheme}://{base.netloc}{path[:path.rfind('/') + 1]}{href}"
+
+def doc_key(link: str) -> str:
+    """Filename stem for a document URL – dedup only, so a fast non-crypto hash."""
+    return xxhash.xxh64(link.encode()).hexdigest()
+
+def migrate_sha1_names() -> None:
+    """One-off, run by open_index() before it seeds a new index: rename legacy
+    data/<sha1>.<ext> files using the sources in JSON_PATH."""
+    legacy = {p.stem: p for p in DATA_DIR.glob("*.*") if len(p.stem) == 40}
+    if not legacy or not JSON_PATH.exists():
+        return
     try:
-        with pdfplumber.open(path) as pdf:
-            txt = (pdf.pages[0].extract_text(x_tolerance=2) or "")[:1500]
-    except Exception as e:
-        logging.warning(f"⚠️  PDF parse failed for {path.name}: {e}")
-        return {"posted": "n/a", "deadline": "n/a", "snippet": f"Error parsing PDF: {e}"}
+        known = orjson.loads(JSON_PATH.read_bytes())
+    except orjson.JSONDecodeError:
+        known = []
+    for item in known:
+        path = legacy.pop(hashlib.sha1(item["source"].encode()).hexdigest(), None)
+        if path is not None:
+            path.rename(path.with_stem(doc_key(item["source"])))
+    if legacy:                           # no source to rehash; indexed under their old names
+        logging.info(f"ℹ️   {len(legacy)} legacy files in {DATA_DIR} have no entry in {JSON_PATH}, left as is")
+
+def seed_log() -> None:
+    """One-off: start LOG_PATH from the entries already in JSON_PATH."""
+    if LOG_PATH.exists() or not JSON_PATH.exists() or JSON_PATH.stat().st_size == 0:
+        return
+    try:
+        existing_rfps = orjson.loads(JSON_PATH.read_bytes())
+    except orjson.JSONDecodeError:
+        logging.warning(f"⚠️  Could not decode {JSON_PATH}. Starting a fresh {LOG_PATH}.")
+        return
+    with LOG_PATH.open("wb") as f:
+        for item in existing_rfps:
+            f.write(orjson.dumps(item) + b"\n")
+
+def file_sha256(path: pathlib.Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def open_index(path: pathlib.Path) -> sqlite3.Connection:
+    """Dedup index of the documents in DATA_DIR, so startup needs no directory scan.
+
+    Rows for files already on disk get their sha256, so an unchanged archived
+    document is recognised by its bytes rather than parsed and logged again.
+    """
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS seen (hash TEXT PRIMARY KEY, source TEXT, ts INTEGER, "
+               "etag TEXT, last_modified TEXT, sha256 TEXT)")
+    if db.execute("SELECT 1 FROM seen LIMIT 1").fetchone() is None:
+        # first run against an existing archive: seed from the directory once
+        migrate_sha1_names()
+        with db:
+            db.executemany(
+                "INSERT OR IGNORE INTO seen (hash, ts, sha256) VALUES (?, ?, ?)",
+                [(p.stem, int(p.stat().st_mtime), file_sha256(p)) for p in DATA_DIR.glob("*.*") if p != path],
+            )
+    return db
+
+@dataclass
+class Seen:
+    """What the index knows about already-downloaded documents, for one run."""
+    validators: dict[str, tuple[str | None, str | None, str | None]]  # hash → (etag, last_modified, sha256)
+    digests: dict[str, str]                                           # sha256 → hash
+    claimed: set[str] = field(default_factory=set)                    # hashes handled this run
+
+def load_seen(index: sqlite3.Connection) -> Seen:
+    rows = index.execute("SELECT hash, etag, last_modified, sha256 FROM seen").fetchall()
+    return Seen(
+        validators={h: (etag, last_modified, sha) for h, etag, last_modified, sha in rows},
+        digests={sha: h for h, _, _, sha in rows if sha},
+    )
 
-    posted   = date_pat.search(txt)
-    deadline = ddl_pat.search(txt)
+def text_meta(txt: str) -> dict[str, str]:
+    """{posted, deadline, snippet} from the leading text of a document."""
+    found = {}
+    for m in DATE_RE.finditer(txt):
+        found.setdefault(DATE_KIND[m.group("kind").lower()], m.group("val").strip())
     return {
-        "posted":   posted.group(2).strip()   if posted   else "n/a",
-        "deadline": deadline.group(2).strip() if deadline else "n/a",
+        "posted":   found.get("posted", "n/a"),
+        "deadline": found.get("deadline", "n/a"),
         "snippet":  " ".join(txt.replace("\n", " ").split()[:60]),
     }
 
+def init_parser() -> None:
+    """Once per pool worker: keep MuPDF's diagnostics for our log instead of raw stderr."""
+    pymupdf.TOOLS.mupdf_display_errors(False)
+    pymupdf.TOOLS.mupdf_display_warnings(False)
+
+def is_scanned(doc: pymupdf.Document) -> bool:
+    """True if the first pages are images with (next to) no text layer.
+
+    Page 2 is checked too, so a picture-only cover in front of real text doesn't count.
+    """
+    pages = [doc.load_page(i) for i in range(min(2, doc.page_count))]
+    return all(page.get_images() and len(page.get_text("text").strip()) < SCANNED_TEXT_MIN
+               for page in pages)
+
+@contextlib.contextmanager
+def open_pdf(src: bytes | pathlib.Path) -> Iterator[pymupdf.Document]:
+    """MuPDF document over the downloaded bytes, or over a read-only mmap of a big file."""
+    if isinstance(src, bytes):
+        with pymupdf.open(stream=src, filetype="pdf") as doc:
+            yield doc
+        return
+    # a memoryview is handed to MuPDF as-is; bytes(mm) would copy the whole file
+    with open(src, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+         memoryview(mm) as view, pymupdf.open(stream=view, filetype="pdf") as doc:
+        yield doc
+
+def first_page_text(src: bytes | pathlib.Path, name: str) -> str | None:
+    """Plain text of page 1 via MuPDF (None for scans); pdfplumber only for files MuPDF rejects."""
+    try:
+        with open_pdf(src) as doc:
+            txt = doc.load_page(0).get_text("text")
+            if len(txt.strip()) < SCANNED_TEXT_MIN and is_scanned(doc):
+                return None
+            return txt
+    except Exception as e:
+        logging.info(f"ℹ️   MuPDF could not read {name} ({e}); trying pdfplumber")
+    finally:
+        if warnings := pymupdf.TOOLS.mupdf_warnings():
+            logging.info(f"ℹ️   MuPDF on {name}: {warnings.splitlines()[0]}")
+            pymupdf.TOOLS.reset_mupdf_warnings()
+    return plumber_text(src)
+
+def plumber_text(src: bytes | pathlib.Path) -> str:
+    """pdfplumber fallback without layout reconstruction, cut off after PLUMBER_TIMEOUT s."""
+    def give_up(signum, frame):
+        raise TimeoutError(f"pdfplumber gave up after {PLUMBER_TIMEOUT}s")
+    previous = signal.signal(signal.SIGALRM, give_up)   # pool workers run tasks on their main thread
+    signal.alarm(PLUMBER_TIMEOUT)
+    try:
+        with pdfplumber.open(io.BytesIO(src) if isinstance(src, bytes) else src) as pdf:
+            return pdf.pages[0].extract_text_simple(x_tolerance=2) or ""
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+def sniff_pdf(src: bytes | pathlib.Path) -> bool:
+    """Does it start like a PDF? Readers tolerate some junk before the header, so look at 1 KiB."""
+    if isinstance(src, bytes):
+        head = src[:1024]
+    else:
+        with open(src, "rb") as f:
+            head = f.read(1024)
+    return b"%PDF-" in head
+
+def parse_pdf(src: bytes | pathlib.Path, name: str) -> dict[str, str | bool]:
+    """Return {posted, deadline, snippet} from first ~1500 chars of a PDF."""
+    try:
+        if not sniff_pdf(src):           # e.g. an HTML error page served with 200 OK
+            logging.warning(f"⚠️  {name} is not a PDF, skipping")
+            return {"posted": "n/a", "deadline": "n/a", "snippet": "Not a PDF (HTML or error page?)", "parse_error": True}
+        txt = first_page_text(src, name)
+    except Exception as e:
+        logging.warning(f"⚠️  PDF parse failed for {name}: {e}")
+        return {"posted": "n/a", "deadline": "n/a", "snippet": f"Error parsing PDF: {e}", "parse_error": True}
+    if txt is None:
+        logging.info(f"ℹ️   {name} is a scanned image PDF, skipping text extraction")
+        return {"posted": "n/a", "deadline": "n/a", "snippet": "Scanned image PDF – OCR required", "needs_ocr": True}
+    txt = txt[:1500]
+
+    return text_meta(txt)
+
 ## NEW: Add a parser specifically for .docx files ##
-def parse_docx(path: pathlib.Path) -> dict[str, str]:
+def parse_docx(src: bytes | pathlib.Path, name: str) -> dict[str, str | bool]:
     """Return {posted, deadline, snippet} from first ~1500 chars of a DOCX."""
     try:
-        doc = docx.Document(path)
+        doc = docx.Document(io.BytesIO(src) if isinstance(src, bytes) else str(src))
         full_text = "\n".join([para.text for para in doc.paragraphs])
         txt = full_text[:1500]
     except Exception as e:
-        logging.warning(f"⚠️  DOCX parse failed for {path.name}: {e}")
-        return {"posted": "n/a", "deadline": "n/a", "snippet": f"Error parsing DOCX: {e}"}
+        logging.warning(f"⚠️  DOCX parse failed for {name}: {e}")
+        return {"posted": "n/a", "deadline": "n/a", "snippet": f"Error parsing DOCX: {e}", "parse_error": True}
 
-    posted   = date_pat.search(txt)
-    deadline = ddl_pat.search(txt)
-    return {
-        "posted":   posted.group(2).strip()   if posted   else "n/a",
-        "deadline": deadline.group(2).strip() if deadline else "n/a",
-        "snippet":  " ".join(txt.replace("\n", " ").split()[:60]),
-    }
+    return text_meta(txt)
 
 # ---------------------------------------------------------------------
 # 3. Main driver
 # ---------------------------------------------------------------------
+Result = tuple[dict | None, tuple | None]   # (metadata for LOG_PATH, row for the seen index)
+Download = tuple[pathlib.Path, bytes | None, tuple | None]   # (destination, body or None if in .part, old row)
+
+async def produce_links(session: httpx.AsyncClient, tag: str, url: str,
+                        seen: Seen, links: asyncio.Queue) -> None:
+    """Stage 1: queue every document linked from one landing page."""
+    logging.info("🌐  %-10s → %s", tag, url)
+    for link in await doc_links(session, url):
+        h = doc_key(link)
+        if h in seen.claimed:            # another site links the same doc
+            continue
+        seen.claimed.add(h)
+        await links.put((tag, h, link))
+
+async def download_doc(session: httpx.AsyncClient, h: str, link: str,
+                       seen: Seen) -> tuple[Download | dict | None, tuple | None]:
+    """Download (or revalidate) one document → (download to parse if its bytes are new, index row).
+
+    A PDF over MAX_PDF_BYTES comes back as ready-made metadata instead, unparsed.
+    """
+    ## MODIFIED: Save file with its original extension ##
+    file_ext = pathlib.Path(link).suffix.lower()
+    if not file_ext in [".pdf", ".docx", ".doc"]: # Sanity check
+        logging.warning(f"⚠️  Skipping unknown file type: {link}")
+        return None, None
+
+    file_path = DATA_DIR / f"{h}{file_ext}"
+    etag, last_modified, old_digest = seen.validators.get(h, (None, None, None))
+    validators = {}
+    if etag:
+        validators["If-None-Match"] = etag
+    if last_modified:
+        validators["If-Modified-Since"] = last_modified
+    # what the index says now; kept if the new bytes turn out to be junk
+    previous = (h, link, int(time.time()), etag, last_modified, old_digest) if h in seen.validators else None
+    logging.info("🔄  Revalidating %s" if previous else "⬇️   Downloading %s", link)
+    try:
+        status, headers, digest, body = await download(
+            session, link, file_path, validators,
+            max_bytes=MAX_PDF_BYTES if file_ext == ".pdf" else None)
+    except TooLarge as e:
+        logging.warning("⚠️  %s is %d bytes, over MAX_PDF_BYTES – skipped", link, e.size)
+        if previous:                         # listed on an earlier run already
+            return None, previous
+        row = (h, link, int(time.time()), None, None, None)
+        return {"posted": "n/a", "deadline": "n/a", "snippet": "(PDF too large, skipped)", "size": e.size}, row
+    except FETCH_ERRORS as e:
+        logging.warning("⚠️  Download failed %s: %s", link, e)
+        return None, None
+    if status == 304:
+        return None, None
+
+    row = (h, link, int(time.time()), headers.get("ETag"), headers.get("Last-Modified"), digest)
+    if digest == old_digest:             # no validators, but the same bytes as last time
+        part_path(file_path).unlink(missing_ok=True)
+        return None, row
+    owner = seen.digests.setdefault(digest, h)
+    if owner != h:                       # identical body under another URL (cache-buster etc.)
+        logging.info("♻️   %s has the same content as %s, not kept", link, owner)
+        part_path(file_path).unlink(missing_ok=True)
+        return None, previous or row     # a shared error page must not overwrite a known row
+    return (file_path, body, previous), row
+
+def keep(file_path: pathlib.Path, body: bytes | None, parsed: bool) -> None:
+    """Move a parsed download into DATA_DIR – unless the parser choked on it."""
+    part = part_path(file_path)
+    if not parsed:
+        logging.info(f"ℹ️   {file_path.name} could not be parsed, not kept")
+        part.unlink(missing_ok=True)
+    elif body is None:
+        part.replace(file_path)
+    else:
+        file_path.write_bytes(body)
+
+async def parse_doc(pool: ProcessPoolExecutor, tag: str, link: str,
+                    file_path: pathlib.Path, body: bytes | None, known: bool) -> dict | None:
+    """Metadata for one download – or None if a known document now fails to parse."""
+    # MuPDF text extraction (pdfplumber as its fallback) is CPU-bound; parse in worker processes
+    loop = asyncio.get_running_loop()
+    src = part_path(file_path) if body is None else body
+    meta = {}
+    ## MODIFIED: Call the correct parser based on file type ##
+    if file_path.suffix == ".pdf":
+        meta = await loop.run_in_executor(pool, parse_pdf, src, file_path.name)
+    elif file_path.suffix == ".docx":
+        meta = await loop.run_in_executor(pool, parse_docx, src, file_path.name)
+    elif file_path.suffix == ".doc":
+        logging.info(f"ℹ️   Downloaded legacy .doc file, cannot parse text: {link}")
+        meta = {"posted": "n/a", "deadline": "n/a", "snippet": "Legacy .doc file, text extraction not supported."}
+
+    # parse_error only steers keep(); it is not part of the published entry
+    parsed = not meta.pop("parse_error", False)
+    keep(file_path, body, parsed)
+    if not parsed and known:             # e.g. an HTML error page served in place of the PDF
+        logging.info(f"ℹ️   {link} keeps its previous entry")
+        return None
+    meta["portal"] = tag
+    meta["source"] = link
+    return meta
+
+async def download_worker(session: httpx.AsyncClient, seen: Seen, links: asyncio.Queue,
+                          to_parse: asyncio.Queue, results: list[Result]) -> None:
+    """Stage 2: links → downloaded bodies (in memory, or in .part files when large)."""
+    while True:
+        tag, h, link = await links.get()
+        try:
+            fetched, row = await download_doc(session, h, link, seen)
+            if fetched is None:
+                results.append((None, row))
+            elif isinstance(fetched, dict):
+                results.append(({**fetched, "portal": tag, "source": link}, row))
+            else:
+                await to_parse.put((tag, link, *fetched, row))
+        except Exception:
+            logging.exception(f"⚠️  Unexpected error handling {link}")
+        finally:
+            links.task_done()
+
+async def parse_worker(pool: ProcessPoolExecutor, to_parse: asyncio.Queue,
+                       results: list[Result]) -> None:
+    """Stage 3: downloads → metadata, one job per pool process at a time."""
+    while True:
+        tag, link, file_path, body, previous, row = await to_parse.get()
+        try:
+            meta = await parse_doc(pool, tag, link, file_path, body, known=previous is not None)
+            results.append((meta, row) if meta is not None else (None, previous))
+        except Exception:
+            logging.exception(f"⚠️  Unexpected error parsing {link}")
+        finally:
+            to_parse.task_done()
+
+async def scrape_all(seen: Seen) -> list[Result]:
+    """Landing pages → downloads → parsing, as three stages joined by bounded queues.
+
+    Each stage keeps working while the next is busy, so wall time tracks the
+    slower of network and CPU rather than their sum.
+    """
+    global fetch_slots, host_slots
+    fetch_slots = asyncio.Semaphore(MAX_IN_FLIGHT)   # bound to this run's event loop
+    host_slots = {}
+    links: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    to_parse: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    results: list[Result] = []
+    with ProcessPoolExecutor(max_workers=PARSE_WORKERS, initializer=init_parser) as pool:
+        async with build_session() as session:
+            workers = [asyncio.create_task(download_worker(session, seen, links, to_parse, results))
+                       for _ in range(MAX_IN_FLIGHT)]
+            workers += [asyncio.create_task(parse_worker(pool, to_parse, results))
+                        for _ in range(PARSE_WORKERS)]
+            await asyncio.gather(*[produce_links(session, tag, url, seen, links)
+                                   for tag, url in SITES.items()])
+            await links.join()
+            await to_parse.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    return results
+
 def main() -> None:
     ts = datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z"
     logging.info("🌀  Scraper start %s", ts)
 
-    newly_scraped_rfps: list[dict] = []
-    ## MODIFIED: Check all file types in the data directory, not just PDFs. ##
-    seen_hashes = {p.stem for p in DATA_DIR.glob("*.*")}
-
-    for tag, url in SITES.items():
-        logging.info("🌐  %-10s → %s", tag, url)
-        for link in doc_links(url):
-            h = hashlib.sha1(link.encode()).hexdigest()
-            if h in seen_hashes:
-                continue
-
-            logging.info("⬇️   Downloading %s", link)
-            try:
-                response = session.get(link, timeout=30)
-                response.raise_for_status()
-            except RequestException as e:
-                logging.warning("⚠️  Download failed %s: %s", link, e)
-                continue
-            
-            ## MODIFIED: Save file with its original extension ##
-            file_ext = pathlib.Path(link).suffix.lower()
-            if not file_ext in [".pdf", ".docx", ".doc"]: # Sanity check
-                logging.warning(f"⚠️  Skipping unknown file type: {link}")
-                continue
-
-            file_path = DATA_DIR / f"{h}{file_ext}"
-            file_path.write_bytes(response.content)
-            
-            meta = {}
-            ## MODIFIED: Call the correct parser based on file type ##
-            if file_ext == ".pdf":
-                meta = parse_pdf(file_path)
-            elif file_ext == ".docx":
-                meta = parse_docx(file_path)
-            elif file_ext == ".doc":
-                logging.info(f"ℹ️   Downloaded legacy .doc file, cannot parse text: {link}")
-                meta = {"posted": "n/a", "deadline": "n/a", "snippet": "Legacy .doc file, text extraction not supported."}
-
-            meta["portal"] = tag
-            meta["source"] = link
-            newly_scraped_rfps.append(meta)
-
-    # Load existing JSON robustly
-    existing_rfps = []
-    if JSON_PATH.exists() and JSON_PATH.stat().st_size > 0:
-        try:
-            existing_rfps = json.loads(JSON_PATH.read_text())
-        except json.JSONDecodeError:
-            logging.warning(f"⚠️  Could not decode {JSON_PATH}. Starting fresh.")
-    
-    # Merge and deduplicate
-    final_rfps_dict = {item['source']: item for item in existing_rfps}
-    for item in newly_scraped_rfps:
-        final_rfps_dict[item['source']] = item
-    final_rfps_list = list(final_rfps_dict.values())
-    
-    logging.info(f"✅  Found {len(newly_scraped_rfps)} new documents. Total is now {len(final_rfps_list)}.")
-    JSON_PATH.write_text(json.dumps(final_rfps_list, indent=2))
-    logging.info(f"✅  Wrote {len(final_rfps_list)} total RFP entries to {JSON_PATH}")
+    seed_log()
+    index = open_index(INDEX_DB)
+    results = asyncio.run(scrape_all(load_seen(index)))
+    newly_scraped_rfps = [meta for meta, _ in results if meta is not None]
+
+    # Append-only: only this run's entries are written; compact.py merges them.
+    # Log first, index second – a crash in between re-appends, it never loses entries.
+    with LOG_PATH.open("ab") as f:
+        for item in newly_scraped_rfps:
+            f.write(orjson.dumps(item) + b"\n")
+    logging.info(f"✅  Appended {len(newly_scraped_rfps)} new documents to {LOG_PATH}")
+
+    with index:
+        index.executemany(
+            "INSERT OR REPLACE INTO seen (hash, source, ts, etag, last_modified, sha256) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [row for _, row in results if row is not None],
+        )
+    index.close()
 
 
 if __name__ == "__main__":